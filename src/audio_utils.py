@@ -0,0 +1,135 @@
+"""
+Audio and model helpers shared by the recording scripts.
+"""
+import mlx.core as mx
+from mlx_whisper.transcribe import ModelHolder
+import os
+import struct
+import threading
+import numpy as np
+import pyaudio
+
+def ask_quantized(model_size):
+    """Asks whether to use 4-bit weights (only offered for large)"""
+    if model_size != "large":
+        return False
+    return input("Use 4-bit quantized weights (y/n) [n]: ").strip().lower() == "y"
+
+def load_whisper(model_size, quantized=False):
+    """
+    Loads the MLX Whisper weights and returns the model path to pass to
+    mlx_whisper.transcribe()
+    """
+    if quantized and model_size == "large":
+        # 4-bit weights: large-v3 fits in far less unified memory
+        model_path = "mlx-community/whisper-large-v3-mlx-4bit"
+    else:
+        model_path = f"mlx-community/whisper-{model_size}-mlx"
+    # Force MLX to materialize the weights now, so the first transcription
+    # doesn't pay for it; mlx_whisper.transcribe() reuses this model
+    # through ModelHolder
+    model = ModelHolder.get_model(model_path, mx.float16)
+    mx.eval(model.parameters())
+    return model_path
+
+def write_wav(path, pcm, channels, sampwidth, rate):
+    """
+    Writes PCM data to a WAV file with a hand-built 44-byte header, using
+    os.write directly instead of the wave module
+    """
+    data = memoryview(pcm).cast("B")
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(data), b"WAVE",
+        b"fmt ", 16, 1, channels, rate,
+        rate * channels * sampwidth, channels * sampwidth, sampwidth * 8,
+        b"data", len(data)
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for chunk in (memoryview(header), data):
+            # os.write may write partially or be interrupted by a signal
+            while chunk:
+                try:
+                    written = os.write(fd, chunk)
+                except InterruptedError:
+                    continue
+                chunk = chunk[written:]
+    finally:
+        os.close(fd)
+
+class RingBuffer:
+    """
+    Ring of int16 samples written by the PyAudio callback and read by the
+    recording loop (one writer, one reader, so no lock is needed)
+    """
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        # Total samples written / read so far; each side only moves its own
+        self.write_idx = 0
+        self.read_idx = 0
+
+    def write(self, pcm):
+        """Copies raw int16 bytes into the ring"""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        start = self.write_idx % self.capacity
+        end = start + len(samples)
+        if end <= self.capacity:
+            self.data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.data[start:] = samples[:split]
+            self.data[:end - self.capacity] = samples[split:]
+        # Publish the samples only once they are in place
+        self.write_idx += len(samples)
+
+    def read(self, n):
+        """Copies out the next n samples as one contiguous array"""
+        start = self.read_idx % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            pcm = self.data[start:end].copy()
+        else:
+            pcm = np.concatenate((self.data[start:], self.data[:end - self.capacity]))
+        self.read_idx += n
+        return pcm
+
+class SegmentCapture:
+    """
+    Cuts a PyAudio callback stream into segments of exactly the same number
+    of chunks, so their length is exact without reading the clock
+    """
+    def __init__(self, segment_seconds, rate, chunk, channels):
+        self.chunks_per_segment = (segment_seconds * rate) // chunk
+        self.segment_samples = self.chunks_per_segment * chunk * channels
+        self.chunk_samples = chunk * channels
+        # Two segments: the callback fills one while the other is copied out
+        self.ring = RingBuffer(2 * self.segment_samples)
+        # Released once per full segment by the callback
+        self.segment_ready = threading.Semaphore(0)
+        self.chunks_recorded = 0
+
+    def on_audio(self, in_data, frame_count, time_info, status):
+        """PyAudio callback: stores the captured chunk in the ring"""
+        self.ring.write(in_data)
+        self.chunks_recorded += 1
+        if self.chunks_recorded % self.chunks_per_segment == 0:
+            self.segment_ready.release()
+        return (None, pyaudio.paContinue)
+
+    def next_segment(self):
+        """
+        Blocks until a full segment is recorded and returns its int16 samples.
+        Segments the ring has already overwritten are skipped with a warning.
+        """
+        while True:
+            self.segment_ready.acquire()
+            start = self.ring.read_idx
+            pcm = self.ring.read(self.segment_samples)
+            # Checked after the copy, with room for the chunk being written,
+            # so an overwrite during the copy is caught too
+            behind = self.ring.write_idx + self.chunk_samples - start
+            if behind <= self.ring.capacity:
+                return pcm
+            print("\n⚠️  Recording fell a full segment behind, one segment was lost")
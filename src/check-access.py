@@ -1,6 +1,15 @@
 from dotenv import load_dotenv
 from huggingface_hub import HfApi
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import json
 import os
+import time
+
+# Granted models are remembered per token for 24 h after they are checked
+CACHE_FILE = Path.home() / ".cache" / "mlx-transcribe" / "access.json"
+CACHE_TTL = 24 * 3600
 
 load_dotenv()
 token = os.getenv("HF_TOKEN")
@@ -14,9 +23,52 @@ models_to_check = [
     "pyannote/embedding"
 ]
 
-for model in models_to_check:
+def has_access(model):
+    """Returns True if the token can read the model"""
     try:
-        info = api.model_info(model, token=token)
+        api.model_info(model, token=token)
+        return True
+    except Exception:
+        return False
+
+cache = {}
+if CACHE_FILE.exists():
+    try:
+        cache = json.loads(CACHE_FILE.read_text(encoding="utf-8"))
+    except ValueError:
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+token_key = hashlib.sha256((token or "").encode()).hexdigest()
+
+# Each token entry is {"checked": timestamp, "granted": [models]}; its
+# grants are trusted only until 24 h after that check
+entry = cache.get(token_key)
+fresh = (
+    isinstance(entry, dict)
+    and isinstance(entry.get("checked"), (int, float))
+    and isinstance(entry.get("granted"), list)
+    and time.time() - entry["checked"] < CACHE_TTL
+)
+checked = entry["checked"] if fresh else time.time()
+granted = set(entry["granted"]) if fresh else set()
+
+# Only models not already granted need a request, issued in parallel
+unknown = [model for model in models_to_check if model not in granted]
+with ThreadPoolExecutor(max_workers=3) as executor:
+    newly_granted = [
+        model for model, ok in zip(unknown, executor.map(has_access, unknown)) if ok
+    ]
+granted.update(newly_granted)
+
+for model in models_to_check:
+    if model in granted:
         print(f"✅ {model} - Access granted")
-    except Exception as e:
-        print(f"❌ {model} - Access denied or not accepted")
\ No newline at end of file
+    else:
+        print(f"❌ {model} - Access denied or not accepted")
+
+if newly_granted:
+    # Keep the original check time so older grants still expire on schedule
+    cache[token_key] = {"checked": checked, "granted": sorted(granted)}
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    CACHE_FILE.write_text(json.dumps(cache), encoding="utf-8")
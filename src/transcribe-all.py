@@ -11,13 +11,15 @@ Usage:
 $ uv run transcribe-all.py
 Press CTRL+C to stop recording.
 """
+import mlx.core as mx
 import mlx_whisper
+import numpy as np
 import pyaudio
-import wave
+from audio_utils import ask_quantized, load_whisper, write_wav
 from datetime import datetime
 import os
 
-def record_and_transcribe(model_size="base"):
+def record_and_transcribe(model_size="base", quantized=False):
     """
     Records audio until the user presses Ctrl+C
     """
@@ -28,7 +30,7 @@ def record_and_transcribe(model_size="base"):
     RATE = 16000
     
     print(f"Loading MLX Whisper model '{model_size}'...")
-    # MLX Whisper charge automatiquement le modèle optimisé
+    model_path = load_whisper(model_size, quantized)
     
     # Create folder
     if not os.path.exists("transcriptions"):
@@ -51,11 +53,17 @@ def record_and_transcribe(model_size="base"):
     print("\n🎤 Recording in progress...")
     print("💡 Press Ctrl+C to stop\n")
     
-    frames = []
+    # Grow a single buffer in 1 MB steps instead of keeping one bytes object per chunk
+    GROW_BYTES = 1 << 20
+    buf = bytearray(GROW_BYTES)
+    pos = 0
     try:
         while True:
-            data = stream.read(CHUNK)
-            frames.append(data)
+            data = stream.read(CHUNK, exception_on_overflow=False)
+            if pos + len(data) > len(buf):
+                buf.extend(bytes(GROW_BYTES))
+            buf[pos:pos + len(data)] = data
+            pos += len(data)
     except KeyboardInterrupt:
         print("\n✅ Recording completed")
     
@@ -65,18 +73,18 @@ def record_and_transcribe(model_size="base"):
     
     # Save audio
     print("💾 Saving audio...")
-    wf = wave.open(audio_file, 'wb')
-    wf.setnchannels(CHANNELS)
-    wf.setsampwidth(audio.get_sample_size(FORMAT))
-    wf.setframerate(RATE)
-    wf.writeframes(b''.join(frames))
-    wf.close()
+    write_wav(audio_file, memoryview(buf)[:pos], CHANNELS, audio.get_sample_size(FORMAT), RATE)
     
-    # Transcribe with MLX Whisper
+    # Transcribe with MLX Whisper straight from memory: the recording is
+    # already 16 kHz mono, so there is no need to decode the WAV again
     print("📝 Transcription in progress (using Apple Silicon acceleration)...")
+    # Scale int16 to [-1, 1) inside MLX rather than with two NumPy passes;
+    # float32 because mlx_whisper's log-mel clamps at 1e-10
+    samples = mx.array(np.frombuffer(buf, dtype=np.int16, count=pos // 2))
+    samples = samples.astype(mx.float32) * (1.0 / 32768.0)
     result = mlx_whisper.transcribe(
-        audio_file,
-        path_or_hf_repo=f"mlx-community/whisper-{model_size}-mlx",
+        samples,
+        path_or_hf_repo=model_path,
         language="fr"
     )
     
@@ -91,11 +99,15 @@ def record_and_transcribe(model_size="base"):
         f.write("DETAILS WITH TIMESTAMPS:\n")
         f.write("-" * 50 + "\n\n")
         
-        for segment in result["segments"]:
-            start = segment["start"]
-            end = segment["end"]
-            text = segment["text"]
-            f.write(f"[{start:.2f}s - {end:.2f}s] {text}\n")
+        # Build all timestamped lines with one bound format and a single write
+        segments = result["segments"]
+        lines = map(
+            "[{:.2f}s - {:.2f}s] {}\n".format,
+            [segment["start"] for segment in segments],
+            [segment["end"] for segment in segments],
+            [segment["text"] for segment in segments]
+        )
+        f.write("".join(lines))
     
     print(f"\n✅ Transcription saved: {output_file}")
     print(f"\n📄 Transcribed text:\n{'-'*50}\n{result['text']}\n{'-'*50}")
@@ -106,9 +118,10 @@ if __name__ == "__main__":
     print("=" * 60)
     
     model = input("\nModel size (tiny/base/small/medium/large) [base]: ").strip() or "base"
+    quantized = ask_quantized(model)
     
     try:
-        record_and_transcribe(model)
+        record_and_transcribe(model, quantized)
         print("\n✨ Completed successfully!")
     except Exception as e:
         print(f"\n❌ Error: {e}")
\ No newline at end of file
@@ -21,18 +21,22 @@ Usage:
 Press CTRL+C to stop recording.
 """
 
+import mlx.core as mx
 import mlx_whisper
 import pyaudio
-import wave
+from audio_utils import SegmentCapture, ask_quantized, load_whisper, write_wav
 from datetime import datetime
 import os
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 
-def record_and_transcribe_continuous(model_size="base", segment_minutes=5):
+def record_and_transcribe_continuous(model_size="base", segment_minutes=5, quantized=False):
     """
     Records and transcribes continuously in segments using MLX Whisper
     """
+    if segment_minutes < 1:
+        raise ValueError("Segment duration must be at least 1 minute")
+    
     CHUNK = 1024
     FORMAT = pyaudio.paInt16
     CHANNELS = 1
@@ -40,7 +44,7 @@ def record_and_transcribe_continuous(model_size="base", segment_minutes=5):
     SEGMENT_SECONDS = segment_minutes * 60
     
     print(f"Using MLX Whisper '{model_size}' (Apple Silicon optimized)...")
-    model_path = f"mlx-community/whisper-{model_size}-mlx"
+    model_path = load_whisper(model_size, quantized)
     
     if not os.path.exists("transcriptions"):
         os.makedirs("transcriptions")
@@ -51,12 +55,25 @@ def record_and_transcribe_continuous(model_size="base", segment_minutes=5):
     
     master_file = f"{session_dir}/transcription_complete.txt"
     
-    # Initialize master file
-    with open(master_file, "w", encoding="utf-8") as f:
-        f.write("=" * 50 + "\n")
-        f.write(f"TRANSCRIPTION SESSION - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: {model_size} (MLX - Apple Silicon)\n")
-        f.write("=" * 50 + "\n\n")
+    # Initialize master file, kept open for the whole session and flushed
+    # after each segment
+    master_fp = open(master_file, "w", encoding="utf-8", buffering=1 << 16)
+    master_fp.write("=" * 50 + "\n")
+    master_fp.write(f"TRANSCRIPTION SESSION - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    master_fp.write(f"Model: {model_size} (MLX - Apple Silicon)\n")
+    master_fp.write("=" * 50 + "\n\n")
+    master_fp.flush()
+    
+    # Guards appends to the master file from the workers
+    master_lock = threading.Lock()
+    
+    # A single worker: MLX is best driven serially so each segment gets the
+    # whole GPU, and segments are written to the master file in order
+    transcriber = ThreadPoolExecutor(max_workers=1)
+    
+    # PyAudio's callback thread fills a ring holding two segments, so the
+    # recording loop only copies out whole segments
+    capture = SegmentCapture(SEGMENT_SECONDS, RATE, CHUNK, CHANNELS)
     
     audio = pyaudio.PyAudio()
     stream = audio.open(
@@ -64,7 +81,9 @@ def record_and_transcribe_continuous(model_size="base", segment_minutes=5):
         channels=CHANNELS,
         rate=RATE,
         input=True,
-        frames_per_buffer=CHUNK
+        frames_per_buffer=CHUNK,
+        stream_callback=capture.on_audio,
+        start=False
     )
     
     print("\n🎤 Recording in progress ({} minute segments)...".format(segment_minutes))
@@ -73,64 +92,61 @@ def record_and_transcribe_continuous(model_size="base", segment_minutes=5):
     segment_num = 1
     is_recording = True
     
-    def transcribe_segment(audio_file, segment_num, model_path):
-        """Transcribes a segment in a separate thread"""
+    def transcribe_segment(pcm, segment_num, model_path):
+        """Transcribes a segment in the background worker"""
         print(f"\n📝 Transcribing segment {segment_num} (MLX)...")
         
-        result = mlx_whisper.transcribe(
-            audio_file,
-            path_or_hf_repo=model_path,
-            language="fr"
-        )
-        
-        # Append to master file
-        with open(master_file, "a", encoding="utf-8") as f:
-            f.write(f"\n--- SEGMENT {segment_num} ---\n")
-            f.write(result["text"] + "\n")
+        try:
+            # Convert on the MLX side (float32: the log-mel floor of
+            # 1e-10 underflows in float16)
+            samples = mx.array(pcm).astype(mx.float32) * (1.0 / 32768.0)
+            result = mlx_whisper.transcribe(
+                samples,
+                path_or_hf_repo=model_path,
+                language="fr"
+            )
+            
+            # Append to master file
+            with master_lock:
+                master_fp.write(f"\n--- SEGMENT {segment_num} ---\n")
+                master_fp.write(result["text"] + "\n")
+                master_fp.flush()
+        except Exception as e:
+            print(f"\n❌ Segment {segment_num} failed: {e}")
+            return
         
         print(f"✅ Segment {segment_num} transcribed")
         print(f"   Text: {result['text'][:100]}...")
     
+    stream.start_stream()
     try:
         while is_recording:
-            frames = []
-            segment_start = time.time()
-            
             print(f"\n🔴 Recording segment {segment_num}...")
             
-            # Record for segment duration
-            while time.time() - segment_start < SEGMENT_SECONDS and is_recording:
-                data = stream.read(CHUNK)
-                frames.append(data)
-            
-            if not frames:
-                break
+            # Wait for the callback to signal a full segment
+            pcm = capture.next_segment()
             
             # Save segment
             audio_file = f"{session_dir}/segment_{segment_num:03d}.wav"
-            wf = wave.open(audio_file, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(audio.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
+            write_wav(audio_file, pcm, CHANNELS, audio.get_sample_size(FORMAT), RATE)
             
-            # Transcribe in a separate thread to avoid blocking recording
-            transcribe_thread = threading.Thread(
-                target=transcribe_segment, 
-                args=(audio_file, segment_num, model_path)
-            )
-            transcribe_thread.start()
+            # Transcribe in the background to avoid blocking recording;
+            # Whisper takes the 16 kHz samples directly, no WAV round-trip
+            transcriber.submit(transcribe_segment, pcm, segment_num, model_path)
             
             segment_num += 1
             
     except KeyboardInterrupt:
         print("\n✅ Recording completed")
         is_recording = False
-    
-    stream.stop_stream()
-    stream.close()
-    audio.terminate()
+    finally:
+        stream.stop_stream()
+        stream.close()
+        audio.terminate()
+        
+        print("⏳ Waiting for pending transcriptions...")
+        transcriber.shutdown(wait=True)
+        master_fp.close()
     
     print(f"\n✨ Session completed!")
     print(f"📁 Directory: {session_dir}")
@@ -142,10 +158,11 @@ if __name__ == "__main__":
     print("=" * 60)
     
     model = input("\nModel size (tiny/base/small/medium/large) [base]: ").strip() or "base"
+    quantized = ask_quantized(model)
     segment = input("Segment duration in minutes [5]: ").strip()
     segment = int(segment) if segment else 5
     
     try:
-        record_and_transcribe_continuous(model, segment)
+        record_and_transcribe_continuous(model, segment, quantized)
     except Exception as e:
         print(f"\n❌ Error: {e}")
\ No newline at end of file
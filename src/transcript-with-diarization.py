@@ -6,7 +6,7 @@ for Apple Silicon), and identifies different speakers using pyannote.audio.
 
 Installation:
 $ brew install portaudio ffmpeg
-$ uv add mlx-whisper pyaudio pyannote.audio pydub torch python-dotenv soundfile onnxruntime
+$ uv add mlx-whisper pyaudio pyannote.audio pydub torch python-dotenv soundfile onnxruntime orjson
 
 Setup:
 1. Get a free HuggingFace token: https://huggingface.co/settings/tokens
@@ -20,36 +20,37 @@ $ uv run transcript-with-diarization.py
 Press CTRL+C to stop recording.
 """
 
+import mlx.core as mx
 import mlx_whisper
+import numpy as np
 import pyaudio
-import wave
+from audio_utils import SegmentCapture, ask_quantized, load_whisper, write_wav
 from datetime import datetime
 import os
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pyannote.audio import Pipeline
-import json
+import orjson
 from dotenv import load_dotenv
-import soundfile as sf
 import torch
 
 # Load environment variables from .env file
 load_dotenv()
 
-def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5):
+def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5, quantized=False):
     """
     Records and transcribes continuously with speaker identification
     Combines MLX Whisper (fast) with pyannote (speaker detection)
     """
+    if segment_minutes < 1:
+        raise ValueError("Segment duration must be at least 1 minute")
+    
     CHUNK = 1024
     FORMAT = pyaudio.paInt16
     CHANNELS = 1
     RATE = 16000
     SEGMENT_SECONDS = segment_minutes * 60
     
-    print(f"🔄 Using MLX Whisper '{model_size}' (Apple Silicon optimized)...")
-    mlx_model_path = f"mlx-community/whisper-{model_size}-mlx"
-    
     print("🔄 Loading diarization model...")
     
     # Get token from environment variable
@@ -69,14 +70,24 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
     )
 
     # Use MPS (Metal Performance Shaders) for Apple Silicon
+    diarization_device = None
     try:
         import torch
         if torch.backends.mps.is_available():
-            diarization_pipeline.to(torch.device("mps"))
+            diarization_device = torch.device("mps")
+            diarization_pipeline.to(diarization_device)
             print("✅ Using Apple Silicon GPU (MPS) for diarization")
     except Exception as e:
         print(f"⚠️  Running diarization on CPU: {e}")
     
+    # Run the pyannote models in FP16 on MPS (half the memory traffic);
+    # disabled for the session if an op isn't supported in half precision
+    diarization_fp16 = diarization_device is not None
+    
+    # Load Whisper only once the cheaper setup steps have succeeded
+    print(f"🔄 Using MLX Whisper '{model_size}' (Apple Silicon optimized)...")
+    mlx_model_path = load_whisper(model_size, quantized)
+    
     if not os.path.exists("transcriptions"):
         os.makedirs("transcriptions")
     
@@ -86,13 +97,26 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
     
     master_file = f"{session_dir}/transcription_complete.txt"
     
-    # Initialize master file
-    with open(master_file, "w", encoding="utf-8") as f:
-        f.write("=" * 70 + "\n")
-        f.write(f"TRANSCRIPTION SESSION WITH SPEAKER DIARIZATION\n")
-        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Model: {model_size} (MLX Whisper + Pyannote)\n")
-        f.write("=" * 70 + "\n\n")
+    # Initialize master file; one handle serves the whole session
+    master_fp = open(master_file, "w", encoding="utf-8", buffering=1 << 16)
+    master_fp.write("=" * 70 + "\n")
+    master_fp.write(f"TRANSCRIPTION SESSION WITH SPEAKER DIARIZATION\n")
+    master_fp.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    master_fp.write(f"Model: {model_size} (MLX Whisper + Pyannote)\n")
+    master_fp.write("=" * 70 + "\n\n")
+    master_fp.flush()
+    
+    # Guards appends to the master file from the workers
+    master_lock = threading.Lock()
+    
+    # One worker per device: diarization (pyannote on MPS) overlaps with
+    # transcription (MLX), and each stays serial so it owns its GPU queue
+    diarizer = ThreadPoolExecutor(max_workers=1)
+    transcriber = ThreadPoolExecutor(max_workers=1)
+    
+    # PyAudio's callback thread fills a ring holding two segments, so the
+    # recording loop only copies out whole segments
+    capture = SegmentCapture(SEGMENT_SECONDS, RATE, CHUNK, CHANNELS)
     
     audio = pyaudio.PyAudio()
     stream = audio.open(
@@ -100,7 +124,9 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
         channels=CHANNELS,
         rate=RATE,
         input=True,
-        frames_per_buffer=CHUNK
+        frames_per_buffer=CHUNK,
+        stream_callback=capture.on_audio,
+        start=False
     )
     
     print(f"\n🎤 Recording in progress ({segment_minutes} min segments)...")
@@ -109,85 +135,144 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
     segment_num = 1
     is_recording = True
     
-    def transcribe_with_speakers(audio_file, segment_num):
-        """Transcribes a segment with speaker identification"""
+    def diarize(audio_dict):
+        """Runs diarization in FP16 on MPS, falling back to FP32"""
+        nonlocal diarization_fp16
+        if diarization_fp16:
+            try:
+                with torch.autocast(device_type="mps", dtype=torch.float16):
+                    return diarization_pipeline(audio_dict)
+            except RuntimeError as e:
+                print(f"⚠️  FP16 diarization failed, falling back to FP32: {e}")
+                diarization_fp16 = False
+        return diarization_pipeline(audio_dict)
+    
+    def diarize_segment(pcm, audio_file, segment_num):
+        """Saves a segment and identifies its speakers (diarization worker)"""
+        # Keep the WAV as an on-disk artifact, written off the recording thread
+        write_wav(audio_file, pcm, CHANNELS, audio.get_sample_size(FORMAT), RATE)
+        
         print(f"\n📝 Analyzing segment {segment_num}...")
 
-        # Load audio in memory (workaround for torchcodec issues)
-        waveform, sample_rate = sf.read(audio_file)
-        # Convert to torch tensor and add channel dimension if needed
-        waveform_tensor = torch.from_numpy(waveform).float()
-        if waveform_tensor.ndim == 1:
-            waveform_tensor = waveform_tensor.unsqueeze(0)  # Add channel dimension
-
+        # Pass audio in memory (workaround for torchcodec issues): view the
+        # recorded int16 samples as a tensor and convert once, adding a
+        # channel dimension
+        waveform = torch.from_numpy(pcm)
+        waveform = waveform.to(torch.float32).mul_(1 / 32768.0).unsqueeze(0)
+        if diarization_device is not None:
+            waveform = waveform.to(diarization_device, non_blocking=True)
         audio_dict = {
-            "waveform": waveform_tensor,
-            "sample_rate": sample_rate
+            "waveform": waveform,
+            "sample_rate": RATE
         }
 
         # 1. Diarization (who speaks when)
         print(f"   👥 Identifying speakers...")
-        diarization = diarization_pipeline(audio_dict)
-        
-        # 2. Transcription with MLX Whisper (fast!)
-        print(f"   🗣️  Transcribing audio (MLX)...")
-        result = mlx_whisper.transcribe(
-            audio_file,
-            path_or_hf_repo=mlx_model_path,
-            language="fr",
-            word_timestamps=True  # Important for syncing with diarization
-        )
-        
-        # 3. Merge diarization and transcription
-        print(f"   🔗 Merging data...")
-        transcript_with_speakers = []
+        diarization = diarize(audio_dict)
         
-        for segment in result["segments"]:
-            start_time = segment["start"]
-            end_time = segment["end"]
-            text = segment["text"]
+        # Linearize the turns once into plain (start, end, speaker) tuples;
+        # pyannote.audio 4.0+ DiarizeOutput has .speaker_diarization attribute
+        return [
+            (turn.start, turn.end, speaker)
+            for turn, speaker in diarization.speaker_diarization
+        ]
+    
+    def transcribe_with_speakers(pcm, segment_num, diarization_future):
+        """Transcribes a segment and merges it with its diarization (Whisper worker)"""
+        try:
+            # 2. Transcription with MLX Whisper (fast!), overlapping with the
+            # diarization running on MPS
+            print(f"   🗣️  Transcribing segment {segment_num} (MLX)...")
+            # int16 -> float32 in MLX, in one lazy cast-and-scale
+            samples = mx.array(pcm).astype(mx.float32) * (1.0 / 32768.0)
+            result = mlx_whisper.transcribe(
+                samples,
+                path_or_hf_repo=mlx_model_path,
+                language="fr"
+            )
             
-            # Find dominant speaker for this segment
-            speaker = get_speaker_for_time(diarization, start_time, end_time)
+            turns = diarization_future.result()
             
-            transcript_with_speakers.append({
-                "speaker": speaker,
-                "start": start_time,
-                "end": end_time,
-                "text": text.strip()
-            })
-        
-        # 4. Format and save
-        formatted_text = format_transcript(transcript_with_speakers, segment_num)
-        
-        with open(master_file, "a", encoding="utf-8") as f:
-            f.write(formatted_text)
-        
-        # Also save as JSON for later analysis
-        json_file = f"{session_dir}/segment_{segment_num:03d}.json"
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(transcript_with_speakers, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ Segment {segment_num} completed")
-        print_preview(transcript_with_speakers)
+            # 3. Merge diarization and transcription
+            print(f"   🔗 Merging data...")
+            segments = result["segments"]
+            
+            # Find dominant speaker for every segment at once
+            speakers = assign_speakers(
+                index_turns(turns),
+                np.array([segment["start"] for segment in segments], dtype=np.float64),
+                np.array([segment["end"] for segment in segments], dtype=np.float64)
+            )
+            
+            transcript_with_speakers = [
+                {
+                    "speaker": speaker,
+                    "start": segment["start"],
+                    "end": segment["end"],
+                    "text": segment["text"].strip()
+                }
+                for segment, speaker in zip(segments, speakers)
+            ]
+            
+            # 4. Format and save
+            formatted_text = format_transcript(transcript_with_speakers, segment_num)
+            
+            # Flushed at each segment boundary so a crash loses at most the
+            # current segment
+            with master_lock:
+                master_fp.write(formatted_text)
+                master_fp.flush()
+            
+            # Also save as JSON for later analysis
+            json_file = f"{session_dir}/segment_{segment_num:03d}.json"
+            # orjson serializes in C and emits UTF-8 bytes directly
+            with open(json_file, "wb") as f:
+                f.write(orjson.dumps(transcript_with_speakers, option=orjson.OPT_INDENT_2))
+            
+            print(f"✅ Segment {segment_num} completed")
+            print_preview(transcript_with_speakers)
+        except Exception as e:
+            print(f"\n❌ Segment {segment_num} failed: {e}")
     
-    def get_speaker_for_time(diarization, start, end):
-        """Finds the main speaker for a time interval"""
-        speaker_time = {}
+    def index_turns(turns):
+        """Builds arrays of the (start, end, speaker) diarization turns"""
+        speaker_ids = {}
+        ids = [speaker_ids.setdefault(speaker, len(speaker_ids)) for _, _, speaker in turns]
 
-        # pyannote.audio 4.0+ DiarizeOutput has .speaker_diarization attribute
-        for turn, speaker in diarization.speaker_diarization:
-            overlap_start = max(turn.start, start)
-            overlap_end = min(turn.end, end)
+        return (
+            np.array([start for start, _, _ in turns], dtype=np.float64),
+            np.array([end for _, end, _ in turns], dtype=np.float64),
+            np.array(ids, dtype=np.int64),
+            list(speaker_ids)
+        )
+    
+    def assign_speakers(turns, seg_starts, seg_ends):
+        """Finds the main speaker for each time interval"""
+        starts, ends, ids, speakers = turns
+        if not speakers:
+            return ["Unknown Speaker"] * len(seg_starts)
+
+        # (segments, turns) overlap matrix
+        overlap = np.maximum(0, (
+            np.minimum(ends[None, :], seg_ends[:, None])
+            - np.maximum(starts[None, :], seg_starts[:, None])
+        ))
+        # Index of each overlapping turn, to break ties like a sequential scan
+        turn_index = np.where(overlap > 0, np.arange(len(ids)), len(ids))
 
-            if overlap_start < overlap_end:
-                duration = overlap_end - overlap_start
-                speaker_time[speaker] = speaker_time.get(speaker, 0) + duration
+        # Group turns by speaker and reduce each group to one column
+        order = np.argsort(ids, kind="stable")
+        groups = np.searchsorted(ids[order], np.arange(len(speakers)))
+        speaker_time = np.add.reduceat(overlap[:, order], groups, axis=1)
+        first_turn = np.minimum.reduceat(turn_index[:, order], groups, axis=1)
 
-        if not speaker_time:
-            return "Unknown Speaker"
+        # On ties, keep the speaker whose turn comes first
+        best_time = speaker_time.max(axis=1)
+        is_best = speaker_time == best_time[:, None]
+        best = np.where(is_best, first_turn, len(ids)).argmin(axis=1)
 
-        return max(speaker_time, key=speaker_time.get)
+        labels = np.array(speakers + ["Unknown Speaker"], dtype=object)
+        return labels[np.where(best_time > 0, best, len(speakers))].tolist()
     
     def format_transcript(segments, segment_num):
         """Formats transcription with speakers"""
@@ -214,12 +299,15 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
         output += "\n"
         return output
     
+    # Preformatted pieces, so timestamps are assembled by lookup
+    TWO_DIGITS = [f"{i:02d}" for i in range(100)]
+    MINUTES_SECONDS = [f":{m:02d}:{s:02d}" for m in range(60) for s in range(60)]
+    
     def format_time(seconds):
         """Formats time as HH:MM:SS"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        hours, rest = divmod(int(seconds), 3600)
+        hh = TWO_DIGITS[hours] if hours < 100 else str(hours)
+        return hh + MINUTES_SECONDS[rest]
     
     def print_preview(segments):
         """Displays preview of first 3 sentences"""
@@ -228,45 +316,37 @@ def record_and_transcribe_with_diarization(model_size="base", segment_minutes=5)
             print(f"   {seg['speaker']}: {seg['text'][:60]}...")
     
     # Main recording loop
+    stream.start_stream()
     try:
         while is_recording:
-            frames = []
-            segment_start = time.time()
-            
             print(f"\n🔴 Recording segment {segment_num}...")
             
-            while time.time() - segment_start < SEGMENT_SECONDS and is_recording:
-                data = stream.read(CHUNK)
-                frames.append(data)
+            # Wait for the callback to signal a full segment
+            pcm = capture.next_segment()
             
-            if not frames:
-                break
-            
-            # Save segment
+            # Save and analyze in the background to avoid blocking recording
             audio_file = f"{session_dir}/segment_{segment_num:03d}.wav"
-            wf = wave.open(audio_file, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(audio.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            
-            # Transcribe with diarization in separate thread
-            transcribe_thread = threading.Thread(
-                target=transcribe_with_speakers,
-                args=(audio_file, segment_num)
+            diarization_future = diarizer.submit(
+                diarize_segment, pcm, audio_file, segment_num
+            )
+            transcriber.submit(
+                transcribe_with_speakers, pcm, segment_num, diarization_future
             )
-            transcribe_thread.start()
             
             segment_num += 1
             
     except KeyboardInterrupt:
         print("\n✅ Recording completed")
         is_recording = False
-    
-    stream.stop_stream()
-    stream.close()
-    audio.terminate()
+    finally:
+        stream.stop_stream()
+        stream.close()
+        audio.terminate()
+        
+        print("⏳ Waiting for pending segments...")
+        diarizer.shutdown(wait=True)
+        transcriber.shutdown(wait=True)
+        master_fp.close()
     
     print(f"\n✨ Session completed!")
     print(f"📁 Directory: {session_dir}")
@@ -284,11 +364,12 @@ if __name__ == "__main__":
     print("3. Create .env file with: HF_TOKEN=your_token_here")
     
     model = input("\nWhisper model (tiny/base/small/medium/large) [medium]: ").strip() or "medium"
+    quantized = ask_quantized(model)
     segment = input("Segment duration in minutes [5]: ").strip()
     segment = int(segment) if segment else 5
     
     try:
-        record_and_transcribe_with_diarization(model, segment)
+        record_and_transcribe_with_diarization(model, segment, quantized)
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
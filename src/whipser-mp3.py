@@ -14,7 +14,7 @@ import mlx_whisper
 
 start_time = time.time()
 
-model = "mlx-community/whisper-large-v3-mlx"
+model = "mlx-community/whisper-large-v3-mlx-4bit"
 downloads_folder = Path.home() / "Downloads"
 audio_file_path = str(downloads_folder / "Recording.mp3")
 txt_file_path = str(downloads_folder / "transcription.txt")
@@ -25,8 +25,7 @@ try:
     result = mlx_whisper.transcribe(
         audio_file_path,
         path_or_hf_repo=model,
-        language="fr", 
-        word_timestamps=True
+        language="fr"
     )
 
     with open(txt_file_path, 'w', encoding='utf-8') as f: